@@ -1,15 +1,18 @@
 import Metashape
 import argparse
+import asyncio
 import subprocess
-from glob import glob
 import os
+import shutil
 import sys
-import datetime
+import tempfile
 import time
 
 # --- LOGGING ---
+_STRFTIME = "%Y-%m-%d %H:%M:%S"
+
 def log(msg):
-    print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+    print(f"[{time.strftime(_STRFTIME)}] {msg}")
 
 # --- PROGRESS CALLBACK ---
 last_percent = -1
@@ -25,63 +28,330 @@ def progress_callback(p):
         pass
 
 # --- EXTRACT FRAMES ---
-def extract_frames(videos_dir, output_folder, fps=2):
+VAAPI_DEVICE = "/dev/dri/renderD128"
+
+def hw_device_works(device):
+    # -hwaccels only lists what ffmpeg was built with (distro builds list cuda
+    # without an NVIDIA GPU), so open the device for real on a dummy input.
+    try:
+        return subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error",
+             "-init_hw_device", device,
+             "-f", "lavfi", "-i", "nullsrc", "-frames:v", "1", "-f", "null", "-"],
+            capture_output=True
+        ).returncode == 0
+    except OSError:
+        return False
+
+def detect_hwaccel():
+    # Prefer GPU decode for the 4K/5.7K 360 footage; fall back to CPU if
+    # ffmpeg was built without it or no usable device is present.
+    try:
+        output = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-hwaccels"],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if "cuda" in output and hw_device_works("cuda=hw"):
+        return "cuda"
+    if "vaapi" in output and os.path.exists(VAAPI_DEVICE) and hw_device_works(f"vaapi=hw:{VAAPI_DEVICE}"):
+        return "vaapi"
+    return None
+
+def ffmpeg_cmd(input_path, output_path, fps, hwaccel=None):
+    cmd = ["ffmpeg"]
+    if hwaccel == "vaapi":
+        cmd += ["-vaapi_device", VAAPI_DEVICE]
+    if hwaccel:
+        # Frames stay on the GPU through the fps filter and only the kept
+        # ones are downloaded for JPEG encoding (p010 for 10-bit HEVC).
+        cmd += ["-hwaccel", hwaccel, "-hwaccel_output_format", hwaccel]
+    vf = f"fps={fps},hwdownload,format=nv12|p010le" if hwaccel else f"fps={fps}"
+    return cmd + [
+        "-threads", "2", "-i", input_path,
+        "-qscale:v", "2",
+        "-vf", vf,
+        output_path
+    ]
+
+async def run_ffmpeg(cmd):
+    # Cancelling the wait doesn't stop the child, so kill it before
+    # re-raising rather than leave it writing frames after the script exits.
+    proc = await asyncio.create_subprocess_exec(*cmd)
+    try:
+        return await proc.wait()
+    except BaseException:
+        proc.kill()
+        await proc.wait()
+        raise
+
+async def extract_video(input_path, output_path, fps, limit, hwaccel=None, on_extracted=None):
+    # Frames are written to a staging folder beside the output folder and only
+    # moved in once ffmpeg succeeds, so a failed or interrupted video never
+    # leaves partial frames that the resume check would treat as finished.
+    output_folder = os.path.dirname(output_path)
+    async with limit:
+        staging = tempfile.mkdtemp(prefix=".extract-", dir=os.path.dirname(os.path.normpath(output_folder)))
+        try:
+            staged_path = os.path.join(staging, os.path.basename(output_path))
+            cmd = ffmpeg_cmd(input_path, staged_path, fps, hwaccel)
+            returncode = await run_ffmpeg(cmd)
+            if returncode != 0 and hwaccel:
+                # e.g. a codec the GPU decoder rejects; redo the video on the CPU
+                log(f"⚠️ {hwaccel} decode failed for {os.path.basename(input_path)}, retrying on the CPU...")
+                for entry in os.scandir(staging):
+                    os.remove(entry.path)
+                cmd = ffmpeg_cmd(input_path, staged_path, fps)
+                returncode = await run_ffmpeg(cmd)
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, cmd)
+
+            for entry in os.scandir(staging):
+                os.replace(entry.path, os.path.join(output_folder, entry.name))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    log(f"✅ Extracted frames from {os.path.basename(input_path)}")
+    # Runs outside the semaphore so the next video starts extracting meanwhile
+    if on_extracted:
+        await on_extracted(input_path, output_path)
+
+async def extract_frames(videos_dir, output_folder, fps=2, on_extracted=None):
     os.makedirs(output_folder, exist_ok=True)
+    # Staging folders left by a run that was killed mid-extraction hold only
+    # partial frames; drop them so they don't pile up in the project archive.
+    for entry in os.scandir(os.path.dirname(os.path.normpath(output_folder))):
+        if entry.name.startswith(".extract-") and entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+    # Bases that already have frames, from one scan of the output folder
+    # rather than a glob per video.
+    extracted = {e.name.rsplit("_", 1)[0] for e in os.scandir(output_folder) if e.name.endswith(".jpg")}
+    pending = []
     for filename in sorted(os.listdir(videos_dir)):
         if filename.lower().endswith(('.mp4', '.mov', '.360')):
-            input_path = os.path.join(videos_dir, filename)
             base = os.path.splitext(filename)[0]
             output_path = os.path.join(output_folder, f"{base}_%04d.jpg")
-            if not glob(output_path.replace('%04d', '*')):
-                log(f"📽️ Extracting frames from {filename}...")
-                subprocess.run([
-                    "ffmpeg", "-i", input_path,
-                    "-qscale:v", "2",
-                    "-vf", f"fps={fps}",
-                    output_path
-                ], check=True)
+            if base not in extracted:
+                pending.append((os.path.join(videos_dir, filename), output_path))
             else:
                 log(f"✅ Frames already extracted for {filename}, skipping...")
 
+    if not pending:
+        return
+
+    # Videos are independent, so run one ffmpeg per video, at most
+    # cpu_count // 2 at a time. Each ffmpeg decodes a single input with
+    # -threads 2, so total decode threads roughly match the core count (and
+    # with a hwaccel, only that many GPU decoders are open at once).
+    workers = max(1, min((os.cpu_count() or 2) // 2, len(pending)))
+    limit = asyncio.Semaphore(workers)
+
+    hwaccel = detect_hwaccel()
+    log(f"🎞️ ffmpeg decode: {hwaccel or 'cpu'}")
+
+    log(f"📽️ Extracting frames from {len(pending)} videos using {workers} ffmpeg workers...")
+    # Let every video finish (and move its frames in) before reporting a
+    # failure, instead of abandoning sibling ffmpegs mid-run.
+    results = await asyncio.gather(
+        *(extract_video(input_path, output_path, fps, limit, hwaccel, on_extracted) for input_path, output_path in pending),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+# --- EXIFTOOL DAEMON ---
+TAG_ARGS = [
+    "-overwrite_original",
+    "-ProjectionType=equirectangular",
+    "-UsePanoramaViewer=True"
+]
+
+async def start_exiftool(common_args=()):
+    # One persistent exiftool process; argument blocks are streamed over stdin
+    # (an argfile read from "-"), so the Perl startup cost is paid once and
+    # batches aren't bound by command-line length limits. common_args are
+    # applied to every -execute block.
+    cmd = ["exiftool", "-stay_open", "True", "-@", "-"]
+    if common_args:
+        cmd += ["-common_args"] + list(common_args)
+    return await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE
+    )
+
+async def exiftool_execute(proc, args):
+    proc.stdin.write(("\n".join(args) + "\n-execute\n").encode("utf-8"))
+    await proc.stdin.drain()
+    output = []
+    while True:
+        line = await proc.stdout.readline()
+        if not line:
+            raise RuntimeError("exiftool exited unexpectedly")
+        line = line.decode("utf-8", errors="replace")
+        if line.strip() == "{ready}":
+            return "".join(output)
+        output.append(line)
+
+async def stop_exiftool(proc):
+    try:
+        proc.stdin.write(b"-stay_open\nFalse\n")
+        await proc.stdin.drain()
+        proc.stdin.close()
+    except OSError:
+        pass
+    await proc.wait()
+
+async def tag_chunk(files, batch_size, limit, worker=0):
+    async with limit:
+        exiftool = await start_exiftool(TAG_ARGS)
+        try:
+            for i in range(0, len(files), batch_size):
+                batch = files[i:i + batch_size]
+                log(f"📦 Worker {worker}: processing batch {i // batch_size + 1} of {(len(files) + batch_size - 1) // batch_size}")
+                output = await exiftool_execute(exiftool, batch)
+                if "weren't updated" in output:
+                    raise RuntimeError(f"exiftool worker {worker} failed to tag batch {i // batch_size + 1}: {output.strip()}")
+        finally:
+            await stop_exiftool(exiftool)
+
+async def tag_files(files, batch_size, limit):
+    # Shard across one exiftool daemon per core; the semaphore bounds the
+    # number of daemons alive at once across concurrent callers.
+    workers = min(os.cpu_count() or 1, (len(files) + batch_size - 1) // batch_size)
+    shards = [files[k * len(files) // workers:(k + 1) * len(files) // workers] for k in range(workers)]
+    await asyncio.gather(*(tag_chunk(shard, batch_size, limit, k) for k, shard in enumerate(shards)))
+
 # --- INJECT 360 METADATA ---
-def inject_360_metadata(output_folder, batch_size=200):
+async def is_tagged(files, samples=5):
+    # Read the tag from a spread of files (first to last) in one exiftool call,
+    # so a partially tagged previous run is not mistaken for a finished one.
+    count = min(samples, len(files))
+    sample = [files[round(k * (len(files) - 1) / max(count - 1, 1))] for k in range(count)]
+    exiftool = await start_exiftool()
+    try:
+        values = (await exiftool_execute(exiftool, ["-T", "-UsePanoramaViewer"] + sample)).split()
+    except Exception as e:
+        log(f"⚠️ Error reading metadata from sample files: {e}")
+        return False
+    finally:
+        await stop_exiftool(exiftool)
+    return len(values) == len(sample) and all(v == "True" for v in values)
+
+def scan_jpgs(root):
+    # os.walk is scandir-based, so file types come from the directory entries
+    # without a stat per file.
+    jpgs = []
+    for dirpath, _, filenames in os.walk(root):
+        jpgs.extend(os.path.join(dirpath, f) for f in filenames if f.lower().endswith(".jpg"))
+    return sorted(jpgs)
+
+async def inject_360_metadata(output_folder, batch_size=200, tagged=(), limit=None):
     log("🔁 Checking for existing 360° metadata...")
-    all_files = sorted(glob(os.path.join(output_folder, "**/*.jpg"), recursive=True))
+    all_files = scan_jpgs(output_folder)
 
     if not all_files:
         log("⚠️ No JPG files found to tag.")
         return
 
-    last_file = all_files[-1]
-    try:
-        meta_flag = subprocess.getoutput(f'exiftool -s3 -UsePanoramaViewer {last_file}').strip()
-    except Exception as e:
-        log(f"⚠️ Error reading metadata from {last_file}: {e}")
-        meta_flag = ""
+    # Frames tagged earlier in this run don't need checking or retagging
+    all_files = [f for f in all_files if f not in tagged]
+    if not all_files:
+        log("✅ All frames were tagged during extraction.")
+        return
 
-    if meta_flag == "True":
+    if await is_tagged(all_files):
         log("✅ 360° metadata already present. Skipping tagging.")
         return
 
     log("🏷️  Adding 360° metadata to all .jpg files...")
-    for i in range(0, len(all_files), batch_size):
-        batch = all_files[i:i + batch_size]
-        log(f"📦 Processing batch {i // batch_size + 1} of {(len(all_files) + batch_size - 1) // batch_size}")
-        cmd = [
-            "exiftool", "-overwrite_original",
-            "-ProjectionType=equirectangular",
-            "-UsePanoramaViewer=True"
-        ] + batch
-        subprocess.run(cmd, check=True)
+    await tag_files(all_files, batch_size, limit or asyncio.Semaphore(os.cpu_count() or 1))
+
+# --- PREPARE FRAMES ---
+async def prepare_frames(videos_dir, output_folder, fps=2, batch_size=200):
+    # Tag each video's frames as soon as its ffmpeg finishes; its extraction
+    # slot is already free, so the next video extracts while this one is tagged.
+    limit = asyncio.Semaphore(os.cpu_count() or 1)
+    tagged = set()
+
+    async def tag_extracted(input_path, output_path):
+        base = os.path.basename(output_path).rsplit("_", 1)[0]
+        files = sorted(
+            e.path for e in os.scandir(output_folder)
+            if e.name.endswith(".jpg") and e.name.rsplit("_", 1)[0] == base
+        )
+        if files:
+            log(f"🏷️  Adding 360° metadata to {len(files)} frames from {os.path.basename(input_path)}...")
+            await tag_files(files, batch_size, limit)
+            tagged.update(files)
+
+    await extract_frames(videos_dir, output_folder, fps=fps, on_extracted=tag_extracted)
+    await inject_360_metadata(output_folder, batch_size, tagged=tagged, limit=limit)
+
+# --- GPU SETUP ---
+def configure_gpus():
+    # Enable every detected GPU and keep the CPU out of GPU-accelerated stages.
+    # On multi-GPU boxes, depth maps can instead be parallelized by running one
+    # network node per GPU, each with its own single-bit gpu_mask.
+    devices = Metashape.app.enumGPUDevices()
+    if not devices:
+        log("⚠️ No GPU devices detected, running on CPU.")
+        return
+
+    Metashape.app.gpu_mask = (1 << len(devices)) - 1
+    Metashape.app.cpu_enable = False
+    for index, device in enumerate(devices):
+        log(f"🖥️ Using GPU {index}: {device.get('name', 'unknown')}")
+
+# --- NETWORK PROCESSING ---
+def run_network_tasks(doc, tasks, host, root=None, poll_interval=30):
+    # Submit tasks to a Metashape server so nodes (one per machine or per GPU,
+    # see Metashape.app.gpu_mask on each node) process chunks in parallel.
+    project_path = doc.path
+    doc.save()
+    # Release the write lock so the nodes can open and save the project.
+    doc.open(project_path, read_only=True)
+
+    client = Metashape.NetworkClient()
+    client.connect(host)
+    try:
+        batch_path = os.path.relpath(project_path, root) if root else project_path
+        batch_id = client.createBatch(batch_path, tasks)
+        client.setBatchPaused(batch_id, False)
+        log(f"🌐 Submitted batch {batch_id} with {len(tasks)} tasks to {host}")
+
+        while True:
+            status = client.batchStatus(batch_id).get("status")
+            if status == "completed":
+                break
+            if status in ("failed", "aborted"):
+                raise RuntimeError(f"Network batch {batch_id} {status}")
+            time.sleep(poll_interval)
+    finally:
+        client.disconnect()
+
+    doc.open(project_path)
+    log(f"✅ Network batch {batch_id} completed.")
 
 # --- MAIN PHOTOGRAMMETRY PROCESS ---
-def run_photogrammetry_pipeline(base_dir, project_name):
+FILTER_MODES = {
+    "none": Metashape.NoFiltering,
+    "mild": Metashape.MildFiltering,
+    "moderate": Metashape.ModerateFiltering,
+    "aggressive": Metashape.AggressiveFiltering,
+}
+
+def run_photogrammetry_pipeline(base_dir, project_name, depth_downscale=2, filter_mode="mild", network_host=None, network_root=None):
     project_dir = os.path.join(base_dir, project_name)
     frames_dir = os.path.join(project_dir, "frames")
     project_path = os.path.join(project_dir, f"{project_name}.psx")
     exports_dir = os.path.join(project_dir, "exports")
     os.makedirs(exports_dir, exist_ok=True)
 
+    configure_gpus()
+
     # --- CREATE AND ALIGN ---
     log("🧱 Creating Metashape project and aligning...")
     doc = Metashape.Document()
@@ -94,7 +364,7 @@ def run_photogrammetry_pipeline(base_dir, project_name):
     if not doc.chunks:
         chunk = doc.addChunk()
         chunk.label = "MainChunk"
-        images = [os.path.join(frames_dir, f) for f in sorted(os.listdir(frames_dir)) if f.lower().endswith(".jpg")]
+        images = sorted(e.path for e in os.scandir(frames_dir) if e.name.lower().endswith(".jpg"))
         chunk.addPhotos(images)
         chunk.sensors[0].type = Metashape.Sensor.Type.Spherical
         chunk.sensors[0].fixed = False
@@ -129,9 +399,9 @@ def run_photogrammetry_pipeline(base_dir, project_name):
 
             start = i * per_chunk
             end = (i + 1) * per_chunk if i < CHUNK_COUNT - 1 else len(cameras)
-            selected = set(cameras[start:end])
-            for cam in chunk.cameras:
-                if cam.label in {c.label for c in selected}:
+            wanted = {cam.label for cam in cameras[start:end]}
+            for cam in cameras:
+                if cam.label in wanted:
                     new_chunk.cameras.append(cam)
 
             doc.chunks.append(new_chunk)
@@ -140,18 +410,34 @@ def run_photogrammetry_pipeline(base_dir, project_name):
         doc.save()
 
     # --- BUILD POINT CLOUD ---
+    if network_host:
+        tasks = []
+        for chunk in doc.chunks:
+            if not chunk.enabled or not chunk.cameras or not any(cam.transform for cam in chunk.cameras):
+                continue
+            if chunk.depth_maps is None or not chunk.depth_maps:
+                task = Metashape.Tasks.BuildDepthMaps()
+                task.downscale = depth_downscale
+                task.filter_mode = FILTER_MODES[filter_mode]
+                task.reuse_depth = True
+                tasks.append(task.toNetworkTask(chunk))
+
+        if tasks:
+            log(f"🌐 Building depth maps for {len(tasks)} chunks via network processing...")
+            run_network_tasks(doc, tasks, network_host, network_root)
+
     for chunk in doc.chunks:
         log(f"🌫️  Checking point cloud for chunk: {chunk.label}")
 
-        if not chunk.enabled or not chunk.cameras or all([not cam.transform for cam in chunk.cameras]):
+        if not chunk.enabled or not chunk.cameras or not any(cam.transform for cam in chunk.cameras):
             log(f"⚠️ Skipping {chunk.label} — no valid cameras or chunk disabled.")
             continue
 
         if chunk.depth_maps is None or not chunk.depth_maps:
             log(f"  ➤ Building depth maps for {chunk.label}...")
             chunk.buildDepthMaps(
-                downscale=1,
-                filter_mode=Metashape.MildFiltering,
+                downscale=depth_downscale,  # 1=Ultra, 2=High, 4=Medium, 8=Low, 16=Lowest
+                filter_mode=FILTER_MODES[filter_mode],
                 reuse_depth=True,
                 progress=progress_callback
             )
@@ -183,6 +469,27 @@ def run_photogrammetry_pipeline(base_dir, project_name):
             doc.save()
 
     # --- BUILD TEXTURE ---
+    if network_host:
+        # Chunks texture independently; let the server spread them over nodes
+        # instead of baking them one after another in this process.
+        pending = [chunk for chunk in doc.chunks if chunk.model and len(chunk.model.textures) == 0]
+        if pending:
+            uv_task = Metashape.Tasks.BuildUV()
+            uv_task.mapping_mode = Metashape.MappingMode.GenericMapping
+            uv_task.texture_size = 8192
+
+            texture_task = Metashape.Tasks.BuildTexture()
+            texture_task.blending_mode = Metashape.BlendingMode.MosaicBlending
+            texture_task.texture_size = 8192
+            texture_task.ghosting_filter = True
+            texture_task.fill_holes = True
+
+            log(f"🌐 Building textures for {len(pending)} chunks via network processing...")
+            run_network_tasks(doc, [
+                uv_task.toNetworkTask(pending),
+                texture_task.toNetworkTask(pending)
+            ], network_host, network_root)
+
     for chunk in doc.chunks:
         if not chunk.model:
             log(f"⚠️ Skipping texture: no model in chunk {chunk.label}")
@@ -218,9 +525,7 @@ def run_photogrammetry_pipeline(base_dir, project_name):
     glb_dir = os.path.join(exports_dir, "glb_exports")
     os.makedirs(glb_dir, exist_ok=True)
 
-    def export_merged_glb(decimate_ratio=None, label="full"):
-        log(f"📦 Merging and exporting GLB for quality: {label}...")
-
+    def merge_models():
         # Collect only chunks that have a valid model
         chunks_to_merge = []
         for chunk in doc.chunks:
@@ -231,8 +536,8 @@ def run_photogrammetry_pipeline(base_dir, project_name):
                 chunks_to_merge.append(chunk)
 
         if not chunks_to_merge:
-            log(f"❌ No chunks with valid models found for {label}. Skipping...")
-            return
+            log("❌ No chunks with valid models found. Skipping export...")
+            return None
 
         log(f"🛠️ Merging {len(chunks_to_merge)} chunks...")
         doc.mergeChunks(chunks_to_merge, merge_markers=False)
@@ -240,18 +545,16 @@ def run_photogrammetry_pipeline(base_dir, project_name):
         merged_chunk = doc.chunks[-1]  # ✅ get the newly created merged chunk manually
 
         if not merged_chunk or not merged_chunk.model:
-            log(f"❌ Merge failed, no model produced for {label}.")
-            return
+            log("❌ Merge failed, no model produced.")
+            return None
 
-        merged_chunk.label = f"Merged_{label}"
-        if decimate_ratio is not None:
-            log(f"🔻 Decimating merged model to {int(decimate_ratio * 100)}% faces...")
-            target_faces = int(len(merged_chunk.model.faces) * decimate_ratio)
-            merged_chunk.decimateModel(face_count=target_faces)
+        merged_chunk.label = "Merged_full"
+        return merged_chunk
 
+    def export_glb(chunk, label):
         output_path = os.path.join(glb_dir, f"{project_name}_{label}.glb")
         log(f"💾 Saving merged GLB to {output_path}...")
-        merged_chunk.exportModel(
+        chunk.exportModel(
             path=output_path,
             format=Metashape.ModelFormatGLTF,
             binary=True,
@@ -261,16 +564,30 @@ def run_photogrammetry_pipeline(base_dir, project_name):
             texture_format=Metashape.ImageFormat.ImageFormatJPEG,
             draco_compression_level=6
         )
+        log(f"✅ Finished merged GLB export for quality: {label}.")
+
+    # Merge once, then decimate a copy of the merged chunk for each lower quality
+    merged_chunk = merge_models()
+    if merged_chunk is None:
+        return
 
-        log(f"🧹 Removing merged chunk after export...")
-        doc.remove(merged_chunk)
+    export_glb(merged_chunk, "full")
 
-        log(f"✅ Finished merged GLB export for quality: {label}.")
+    total_faces = len(merged_chunk.model.faces)
+    for label, decimate_ratio in [("medium", 0.15), ("low", 0.03)]:
+        log(f"📦 Exporting GLB for quality: {label}...")
+        quality_chunk = merged_chunk.copy()
+        quality_chunk.label = f"Merged_{label}"
+
+        log(f"🔻 Decimating merged model to {int(decimate_ratio * 100)}% faces...")
+        quality_chunk.decimateModel(face_count=int(total_faces * decimate_ratio))
+        export_glb(quality_chunk, label)
+
+        log(f"🧹 Removing {label} chunk after export...")
+        doc.remove(quality_chunk)
 
-    # Export all three qualities
-    export_merged_glb(decimate_ratio=None, label="full")
-    export_merged_glb(decimate_ratio=0.15, label="medium")
-    export_merged_glb(decimate_ratio=0.03, label="low")
+    log("🧹 Removing merged chunk after export...")
+    doc.remove(merged_chunk)
 
     log("✅ All GLB exports complete.")
 
@@ -280,6 +597,10 @@ parser.add_argument("--project-name", required=True, help="Project name (used to
 parser.add_argument("--videos", required=True, help="Directory containing input 360 videos")
 parser.add_argument("--fps", type=int, default=2, help="Frames per second to extract")
 parser.add_argument("--output-dir", default="~/photogrammetry", help="Base output directory")
+parser.add_argument("--depth-downscale", type=int, default=2, choices=[1, 2, 4, 8, 16], help="Depth map downscale (1=Ultra, 2=High, 4=Medium, 8=Low, 16=Lowest)")
+parser.add_argument("--depth-filter", default="mild", choices=list(FILTER_MODES), help="Depth map filtering mode")
+parser.add_argument("--network-host", help="Metashape server host; if set, depth maps and textures are built by network nodes")
+parser.add_argument("--network-root", help="Root path shared with the network nodes (project path is sent relative to it)")
 args = parser.parse_args()
 
 args.output_dir = os.path.expanduser(args.output_dir)
@@ -287,6 +608,5 @@ project_dir = os.path.join(args.output_dir, args.project_name)
 frames_dir = os.path.join(project_dir, "frames")
 
 # --- RUN ---
-extract_frames(args.videos, frames_dir, fps=args.fps)
-inject_360_metadata(frames_dir)
-run_photogrammetry_pipeline(args.output_dir, args.project_name)
+asyncio.run(prepare_frames(args.videos, frames_dir, fps=args.fps))
+run_photogrammetry_pipeline(args.output_dir, args.project_name, depth_downscale=args.depth_downscale, filter_mode=args.depth_filter, network_host=args.network_host, network_root=args.network_root)